@@ -0,0 +1,172 @@
+"""Esquema inicial
+
+Tablas tal como las creaba create_all antes de agregar los índices de consulta
+(esos van en 0002). Cada tabla se crea solo si no existe: en una base de datos
+creada antes con create_all, "alembic upgrade head" registra esta revisión sin
+tocar las tablas y continúa con 0002.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-14 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _auditoria(con_updated_at: bool = True) -> list:
+    """Columnas de estado y fechas comunes a las tablas"""
+    columnas = [
+        sa.Column("status", sa.Boolean(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=True),
+    ]
+    if con_updated_at:
+        columnas.append(sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True))
+    return columnas
+
+
+def upgrade() -> None:
+    # Las tablas que ya existen (creadas antes con create_all) se omiten, así la
+    # migración también aplica sobre esas bases de datos sin "alembic stamp"
+    existentes = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "unit_measures" not in existentes:
+        op.create_table(
+            "unit_measures",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("abbreviation", sa.String(), nullable=False),
+            *_auditoria(con_updated_at=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("name"),
+            sa.UniqueConstraint("abbreviation"),
+        )
+        op.create_index("ix_unit_measures_id", "unit_measures", ["id"])
+
+    if "users" not in existentes:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("username", sa.String(), nullable=False),
+            sa.Column("password_hash", sa.String(), nullable=False),
+            sa.Column("role", sa.Enum("admin", "vendedor", name="userrole"), nullable=True),
+            *_auditoria(),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_username", "users", ["username"], unique=True)
+
+    if "products" not in existentes:
+        op.create_table(
+            "products",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("description", sa.String(), nullable=True),
+            sa.Column("category", sa.String(), nullable=True),
+            sa.Column("purchase_price", sa.Float(), nullable=True),
+            sa.Column("sale_price", sa.Float(), nullable=True),
+            *_auditoria(),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_products_id", "products", ["id"])
+        op.create_index("ix_products_category", "products", ["category"])
+
+    if "presentations" not in existentes:
+        op.create_table(
+            "presentations",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("product_id", sa.Integer(), nullable=False),
+            sa.Column("unit_measure_id", sa.Integer(), nullable=False),
+            sa.Column("quantity", sa.Float(), nullable=False),
+            sa.Column("purchase_price", sa.Float(), nullable=False),
+            sa.Column("sale_price", sa.Float(), nullable=False),
+            sa.Column("description", sa.String(), nullable=True),
+            sa.Column("current_stock", sa.Integer(), nullable=True),
+            *_auditoria(),
+            sa.ForeignKeyConstraint(["product_id"], ["products.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["unit_measure_id"], ["unit_measures.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_presentations_id", "presentations", ["id"])
+
+    if "stocks" not in existentes:
+        op.create_table(
+            "stocks",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("product_id", sa.Integer(), nullable=True),
+            sa.Column("current_quantity", sa.Float(), nullable=True),
+            *_auditoria(),
+            sa.ForeignKeyConstraint(["product_id"], ["products.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_stocks_id", "stocks", ["id"])
+
+    if "movements" not in existentes:
+        op.create_table(
+            "movements",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("product_id", sa.Integer(), nullable=True),
+            sa.Column("user_id", sa.Integer(), nullable=True),
+            sa.Column("quantity", sa.Float(), nullable=False),
+            sa.Column("type", sa.Enum("INGRESO", "EGRESO", name="movementtype"), nullable=False),
+            sa.Column("observation", sa.String(), nullable=True),
+            *_auditoria(),
+            sa.ForeignKeyConstraint(["product_id"], ["products.id"]),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_movements_id", "movements", ["id"])
+
+    if "sales" not in existentes:
+        op.create_table(
+            "sales",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("client_name", sa.String(), nullable=False),
+            sa.Column("client_phone", sa.String(), nullable=False),
+            sa.Column("client_address", sa.String(), nullable=False),
+            sa.Column("total_estimated", sa.Float(), nullable=False),
+            sa.Column("observations", sa.String(), nullable=True),
+            *_auditoria(),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_sales_id", "sales", ["id"])
+
+    if "sale_items" not in existentes:
+        op.create_table(
+            "sale_items",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("sale_id", sa.Integer(), nullable=True),
+            sa.Column("product_id", sa.Integer(), nullable=True),
+            sa.Column("presentation_id", sa.Integer(), nullable=True),
+            sa.Column("product_name", sa.String(), nullable=False),
+            sa.Column("presentation_description", sa.String(), nullable=True),
+            sa.Column("quantity", sa.Float(), nullable=False),
+            sa.Column("price_at_time", sa.Float(), nullable=False),
+            sa.ForeignKeyConstraint(["sale_id"], ["sales.id"], ondelete="CASCADE"),
+            sa.ForeignKeyConstraint(["product_id"], ["products.id"]),
+            sa.ForeignKeyConstraint(["presentation_id"], ["presentations.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_sale_items_id", "sale_items", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("sale_items")
+    op.drop_table("sales")
+    op.drop_table("movements")
+    op.drop_table("stocks")
+    op.drop_table("presentations")
+    op.drop_table("products")
+    op.drop_table("users")
+    op.drop_table("unit_measures")
+    sa.Enum(name="movementtype").drop(op.get_bind(), checkfirst=True)
+    sa.Enum(name="userrole").drop(op.get_bind(), checkfirst=True)
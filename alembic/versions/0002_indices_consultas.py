@@ -0,0 +1,58 @@
+"""Índices de consultas
+
+Índices compuestos y de filtrado usados por los listados, el historial y las
+estadísticas. El índice único de stocks.product_id falla si hay productos con
+más de un registro de stock; hay que depurarlos antes de aplicar la migración.
+Con if_not_exists la migración también aplica sobre bases de datos donde ya se
+ejecutó create_indexes.py.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-14 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Detener la migración con un mensaje claro si hay stock duplicado
+    duplicados = op.get_bind().execute(sa.text(
+        "SELECT product_id FROM stocks GROUP BY product_id HAVING COUNT(*) > 1"
+    )).scalars().all()
+    if duplicados:
+        raise RuntimeError(
+            f"Productos con más de un registro de stock: {duplicados}. "
+            "Depurarlos antes de crear ux_stocks_product_id."
+        )
+
+    op.create_index("ix_products_status_category", "products", ["status", "category"], if_not_exists=True)
+    op.create_index("ux_stocks_product_id", "stocks", ["product_id"], unique=True, if_not_exists=True)
+    op.create_index("ix_movements_created_at", "movements", ["created_at"], if_not_exists=True)
+    op.create_index(
+        "ix_movements_product_created", "movements", ["product_id", sa.text("created_at DESC")], if_not_exists=True
+    )
+    op.create_index("ix_sales_status_created", "sales", ["status", "created_at"], if_not_exists=True)
+    op.create_index("ix_sales_created", "sales", ["created_at"], if_not_exists=True)
+    op.create_index("ix_sale_items_sale", "sale_items", ["sale_id"], if_not_exists=True)
+    op.create_index("ix_sale_items_product", "sale_items", ["product_id"], if_not_exists=True)
+
+
+def downgrade() -> None:
+    op.drop_index("ix_sale_items_product", table_name="sale_items")
+    op.drop_index("ix_sale_items_sale", table_name="sale_items")
+    op.drop_index("ix_sales_created", table_name="sales")
+    op.drop_index("ix_sales_status_created", table_name="sales")
+    op.drop_index("ix_movements_product_created", table_name="movements")
+    op.drop_index("ix_movements_created_at", table_name="movements")
+    op.drop_index("ux_stocks_product_id", table_name="stocks")
+    op.drop_index("ix_products_status_category", table_name="products")
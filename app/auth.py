@@ -1,118 +1,183 @@
 import os
 import bcrypt
+import hashlib
+import hmac
 import logging
+import threading
 import time
-from datetime import datetime, timedelta
+from dataclasses import dataclass
+from datetime import timedelta
 from typing import Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import jwt
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
 # Configuración de logging
 logger = logging.getLogger(__name__)
-logging.getLogger("passlib").setLevel(logging.ERROR)
-
-# --- PARCHE DE COMPATIBILIDAD PARA PYTHON 3.13 ---
-# Passlib busca 'bcrypt.__about__', que no existe en versiones modernas de bcrypt
-if not hasattr(bcrypt, "__about__"):
-    bcrypt.__about__ = type('about', (object,), {'__version__': bcrypt.__version__})
-
-# Parche para la función 'clock' eliminada en Python 3.13
-if not hasattr(time, 'clock'):
-    time.clock = time.perf_counter
-# ------------------------------------------------
 
 # Configuración de seguridad
 SECRET_KEY = os.getenv("SECRET_KEY")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+# Refresh token: permite renovar el access token sin repetir bcrypt. Se firma con
+# su propia clave (si falta, con SECRET_KEY) y lleva typ="refresh" para que no
+# se acepte como access token.
+REFRESH_SECRET_KEY = os.getenv("REFRESH_SECRET_KEY") or SECRET_KEY
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
+# Costo de bcrypt (2^rounds iteraciones). Cada punto menos reduce a la mitad el
+# tiempo de login; 10 sigue por encima del mínimo recomendado por OWASP.
+# Subirlo aumenta la resistencia a fuerza bruta a costa de logins más lentos.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "10"))
+_DEFAULT_EXP_SECONDS = ACCESS_TOKEN_EXPIRE_MINUTES * 60
 
 if not SECRET_KEY:
     logger.error("❌ SECRET_KEY no configurada en variables de entorno")
     # En producción (Railway), esto detendrá el inicio si falta la variable
     raise ValueError("SECRET_KEY debe estar definida en las variables de entorno")
 
-# Configuración de hashing (Bcrypt)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+if not os.getenv("REFRESH_SECRET_KEY"):
+    logger.warning("⚠️ REFRESH_SECRET_KEY no configurada: los refresh tokens se firman con SECRET_KEY")
+
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# Caché de tokens ya validados: evita repetir jwt.decode (HMAC + parseo JSON)
+# en cada petición con el mismo token. La clave es el SHA-256 del token para no
+# guardar el token en claro; cada entrada guarda además su 'exp' para no servir
+# tokens vencidos aunque sigan en la caché.
+_jwt_cache = TTLCache(maxsize=10000, ttl=60)
+_jwt_cache_lock = threading.Lock()
+
 # --- Utilidades de Contraseña ---
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     """Verifica una contraseña contra su hash gestionando el límite de bcrypt"""
+    # Bcrypt tiene un límite de 72 bytes; se codifica una vez y solo se corta si hace falta
+    password_bytes = plain_password.encode("utf-8")
+    if len(password_bytes) > 72:
+        password_bytes = password_bytes[:72]
     try:
-        # Bcrypt tiene un límite de 72 caracteres; truncamos para evitar errores
-        if len(plain_password) > 72:
-            plain_password = plain_password[:72]
-        return pwd_context.verify(plain_password, hashed_password)
-    except Exception as e:
-        logger.error(f"❌ Error en verificación de password: {str(e)}")
+        return bcrypt.checkpw(password_bytes, hashed_password.encode("ascii"))
+    except ValueError as e:
+        # Hash mal formado (incluye UnicodeEncodeError)
+        logger.error("❌ Error en verificación de password: %s", e)
         return False
 
 def get_password_hash(password: str) -> str:
     """Genera un hash de contraseña seguro"""
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode("utf-8")[:72], bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("utf-8")
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """Indica si el hash fue generado con un costo distinto a BCRYPT_ROUNDS"""
+    # Formato: $2b$<costo>$<salt+hash>
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+# --- Excepciones ---
+# Se crea una excepción nueva en cada error: una instancia compartida acumularía
+# el traceback de la petición que la lanzó y compartiría su dict de headers
+def _credentials_exception() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="No se pudo validar las credenciales",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+def _forbidden(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=detail)
 
 # --- Manejo de Tokens ---
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     """Crea un token JWT con los datos proporcionados"""
     to_encode = data.copy()
+    # 'exp' en segundos epoch (entero), como lo define el estándar JWT
     if expires_delta:
-        expire = datetime.utcnow() + expires_delta
+        expire = int(time.time()) + int(expires_delta.total_seconds())
     else:
-        expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+        expire = int(time.time()) + _DEFAULT_EXP_SECONDS
     
-    to_encode.update({"exp": expire})
+    to_encode["exp"] = expire
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def create_refresh_token(data: dict) -> str:
+    """Crea un refresh token JWT de larga duración"""
+    to_encode = data.copy()
+    to_encode["typ"] = "refresh"
+    to_encode["exp"] = int(time.time()) + REFRESH_TOKEN_EXPIRE_DAYS * 86400
+    return jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
+
+def decode_refresh_token(token: str) -> dict:
+    """Valida un refresh token y devuelve sus datos"""
+    try:
+        payload = jwt.decode(token, REFRESH_SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp", "sub"]})
+    except jwt.InvalidTokenError as e:
+        logger.warning("❌ Refresh token inválido: %s", e)
+        raise _credentials_exception()
+    if payload.get("typ") != "refresh":
+        logger.warning("❌ Token sin typ=refresh usado para renovar")
+        raise _credentials_exception()
+    return payload
+
+# --- Usuario autenticado ---
+@dataclass(frozen=True, slots=True)
+class Principal:
+    """Usuario autenticado, resuelto una sola vez por token"""
+    username: str
+    role: str
+    user_id: Optional[int] = None
+
 # --- Dependencias de Usuario ---
-async def get_current_user(token: str = Depends(oauth2_scheme)) -> dict:
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     """Obtiene el usuario actual decodificando el token JWT"""
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="No se pudo validar las credenciales",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+    cache_key = hashlib.sha256(token.encode()).digest()
+    with _jwt_cache_lock:
+        cached = _jwt_cache.get(cache_key)
+    if cached is not None and cached[1] > time.time():
+        return cached[0]
+
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM], options={"require": ["exp", "sub"]})
         username: str = payload.get("sub")
-        role: str = payload.get("role")
+        role = payload.get("role")
         
         if username is None:
             logger.warning("❌ Token sin username (sub)")
-            raise credentials_exception
-            
-        return {"username": username, "role": role}
-    except JWTError as e:
-        logger.warning(f"❌ Error al decodificar JWT: {str(e)}")
-        raise credentials_exception
+            raise _credentials_exception()
+        if payload.get("typ") == "refresh":
+            logger.warning("❌ Refresh token usado como access token")
+            raise _credentials_exception()
+    except jwt.InvalidTokenError as e:
+        logger.warning("❌ Error al decodificar JWT: %s", e)
+        raise _credentials_exception()
+
+    # El rol llega como texto desde el token (se emite con UserRole.value);
+    # cualquier otro valor se trata como sin rol
+    user = Principal(username=username, role=role if isinstance(role, str) else "", user_id=payload.get("uid"))
+    # Solo se guardan tokens válidos
+    with _jwt_cache_lock:
+        _jwt_cache[cache_key] = (user, payload.get("exp", 0))
+    return user
 
 # --- Control de Permisos ---
-def check_admin_role(user: dict = Depends(get_current_user)) -> dict:
+# Roles con acceso a las operaciones de venta
+VENDEDOR_ROLES: frozenset[str] = frozenset({"vendedor", "admin"})
+
+# Son async porque no bloquean: así FastAPI no las despacha al threadpool
+async def check_admin_role(user: Principal = Depends(get_current_user)) -> Principal:
     """Verifica que el usuario tenga rol de administrador"""
-    # Manejamos si el rol viene como objeto Enum o String
-    user_role = user["role"].value if hasattr(user["role"], "value") else user["role"]
-    
-    if user_role != "admin":
-        logger.warning(f"❌ Acceso denegado para: {user['username']} (Rol: {user_role})")
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Operación no permitida para este rol"
-        )
+    if not hmac.compare_digest(user.role, "admin"):
+        logger.warning("❌ Acceso denegado para: %s (Rol: %s)", user.username, user.role)
+        raise _forbidden("Operación no permitida para este rol")
     return user
 
-def check_vendedor_role(current_user: dict = Depends(get_current_user)) -> dict:
+async def check_vendedor_role(current_user: Principal = Depends(get_current_user)) -> Principal:
     """Verifica que el usuario sea vendedor o admin"""
-    user_role = current_user["role"].value if hasattr(current_user["role"], "value") else current_user["role"]
-    
-    if user_role not in ["vendedor", "admin"]:
-        logger.warning(f"❌ Acceso insuficiente para: {current_user['username']}")
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="No tienes permisos suficientes para realizar esta acción"
-        )
-    return current_user
\ No newline at end of file
+    if current_user.role not in VENDEDOR_ROLES:
+        logger.warning("❌ Acceso insuficiente para: %s", current_user.username)
+        raise _forbidden("No tienes permisos suficientes para realizar esta acción")
+    return current_user
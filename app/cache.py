@@ -0,0 +1,65 @@
+import hashlib
+import os
+import threading
+from typing import Any, Callable, Hashable
+
+from cachetools import TTLCache
+from fastapi import Request, Response
+from pydantic import TypeAdapter
+
+# Caché en memoria para listados públicos que cambian poco (medidas, catálogo).
+# Cada recurso tiene un contador de versión que forma parte de la clave: al
+# modificarse el recurso se incrementa y las entradas anteriores dejan de usarse.
+# La caché es local a cada proceso: invalidate() solo afecta al worker que hizo
+# el cambio y los demás sirven su copia hasta CACHE_TTL_SECONDS. No usarla para
+# datos que deban verse al instante en todos los workers.
+# Las claves que dependen de valores libres del cliente (categorías, rangos de
+# fechas) van a una caché aparte (variant=True): así no pueden desplazar de
+# _cache las entradas de los listados canónicos.
+CACHE_TTL_SECONDS = int(os.getenv("CACHE_TTL_SECONDS", "30"))
+
+_cache: TTLCache = TTLCache(maxsize=256, ttl=CACHE_TTL_SECONDS)
+_variants: TTLCache = TTLCache(maxsize=256, ttl=CACHE_TTL_SECONDS)
+_versions: dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def invalidate(resource: str) -> None:
+    """Invalida las respuestas cacheadas de un recurso"""
+    with _lock:
+        _versions[resource] = _versions.get(resource, 0) + 1
+
+
+def cached_json(
+    request: Request,
+    resource: str,
+    key: Hashable,
+    adapter: TypeAdapter,
+    load: Callable[[], Any],
+    private: bool = False,
+    variant: bool = False,
+) -> Response:
+    """Devuelve la respuesta JSON cacheada con ETag, o 304 si el cliente ya la tiene.
+
+    private=True para respuestas que requieren autenticación: los proxies
+    intermedios no deben guardarlas y el navegador debe revalidarlas con el
+    ETag antes de reutilizarlas (no-cache). variant=True para claves formadas
+    con valores arbitrarios del cliente.
+    """
+    store = _variants if variant else _cache
+    with _lock:
+        cache_key = (resource, _versions.get(resource, 0), key)
+        entry = store.get(cache_key)
+
+    if entry is None:
+        body = adapter.dump_json(adapter.validate_python(load(), from_attributes=True))
+        entry = (f'"{hashlib.md5(body).hexdigest()}"', body)
+        with _lock:
+            store[cache_key] = entry
+
+    etag, body = entry
+    cache_control = "private, no-cache" if private else f"public, max-age={CACHE_TTL_SECONDS}"
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
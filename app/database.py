@@ -1,4 +1,6 @@
 import os
+from pathlib import Path
+
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
@@ -8,15 +10,46 @@ load_dotenv()
 
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Pool de conexiones: pool_pre_ping descarta conexiones cerradas por el servidor
+# antes de entregarlas y pool_recycle las renueva antes de que expiren por inactividad
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+engine = create_engine(
+    SQLALCHEMY_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    # Tiempo máximo esperando una conexión libre antes de fallar
+    pool_timeout=int(os.getenv("DB_POOL_TIMEOUT", "30")),
+    pool_pre_ping=True,
+    pool_recycle=int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    # Caché de SQL compilado compartida por Query y select(); el valor por
+    # defecto (500) se queda corto con las variantes de filtros de los listados
+    query_cache_size=int(os.getenv("DB_QUERY_CACHE_SIZE", "1200")),
+)
+# expire_on_commit=False: los objetos siguen usables tras el commit sin recargarlos
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, expire_on_commit=False)
 
 Base = declarative_base()
 
-# Dependencia para obtener la DB en los endpoints
+# Dependencia para obtener la DB en los endpoints. Los endpoints la piden con
+# Depends(get_db, scope="function"): la sesión se cierra y la conexión vuelve al
+# pool en cuanto la respuesta está serializada, sin esperar a que se envíe
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# alembic.ini se resuelve desde este archivo, así los scripts funcionan desde
+# cualquier directorio de trabajo
+ALEMBIC_INI = Path(__file__).resolve().parent.parent / "alembic.ini"
+
+
+def aplicar_migraciones():
+    """Aplica las migraciones pendientes (equivale a "alembic upgrade head")"""
+    from alembic import command
+    from alembic.config import Config
+
+    command.upgrade(Config(str(ALEMBIC_INI)), "head")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Enum, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base
@@ -94,7 +94,13 @@ class Product(Base):
     # Relaciones
     presentations = relationship("Presentation", back_populates="product", cascade="all, delete-orphan")
     movements = relationship("Movement", back_populates="product")
-    stock = relationship("Stock", uselist=False, back_populates="product", cascade="all, delete-orphan")
+    # selectin: el stock se carga en una consulta IN (...) para todos los productos
+    stock = relationship("Stock", uselist=False, back_populates="product", cascade="all, delete-orphan", lazy="selectin")
+
+    # Catálogo público: WHERE status = true [AND category = ?]
+    __table_args__ = (
+        Index("ix_products_status_category", "status", "category"),
+    )
 
 
 class Stock(Base):
@@ -111,6 +117,11 @@ class Stock(Base):
 
     product = relationship("Product", back_populates="stock")
 
+    # Un único registro de stock por producto
+    __table_args__ = (
+        Index("ux_stocks_product_id", "product_id", unique=True),
+    )
+
 
 class Movement(Base):
     __tablename__ = "movements"
@@ -124,12 +135,17 @@ class Movement(Base):
 
     # Auditoría y Estado
     status = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
     product = relationship("Product", back_populates="movements")
     user = relationship("User", back_populates="movements")
 
+    # Historial por producto: WHERE product_id = ? ORDER BY created_at DESC
+    __table_args__ = (
+        Index("ix_movements_product_created", "product_id", created_at.desc()),
+    )
+
 
 class Sale(Base):
     __tablename__ = "sales"
@@ -147,6 +163,12 @@ class Sale(Base):
     # --- AGREGAR ESTA LÍNEA ---
     items = relationship("SaleItem", back_populates="sale", cascade="all, delete-orphan")
 
+    # Pendientes (status = true) y rangos de fecha, ordenados por created_at DESC
+    __table_args__ = (
+        Index("ix_sales_status_created", "status", "created_at"),
+        Index("ix_sales_created", "created_at"),
+    )
+
 class SaleItem(Base):
     __tablename__ = "sale_items"
 
@@ -163,4 +185,10 @@ class SaleItem(Base):
     # Relaciones
     sale = relationship("Sale", back_populates="items")
     product = relationship("Product")
-    presentation = relationship("Presentation", back_populates="sale_items")
\ No newline at end of file
+    presentation = relationship("Presentation", back_populates="sale_items")
+
+    __table_args__ = (
+        Index("ix_sale_items_sale", "sale_id"),
+        # Estadísticas por producto y búsquedas de ventas de un producto
+        Index("ix_sale_items_product", "product_id"),
+    )
\ No newline at end of file
@@ -5,15 +5,15 @@ from .. import models, schemas, auth, database
 
 router = APIRouter(prefix="/auth", tags=["Autenticación"])
 
-@router.post("/register", response_model=dict)
+@router.post("/register", response_model=schemas.UserRegistered)
 def registrar_usuario(
     datos: schemas.UserCreate,
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_admin_role)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.check_admin_role)
 ):
     """Crea un nuevo usuario (solo admin)"""
     # Verificar que el rol sea válido
-    if datos.role not in ["vendedor", "admin"]:
+    if datos.role not in auth.VENDEDOR_ROLES:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Rol debe ser 'vendedor' o 'admin'"
@@ -45,13 +45,14 @@ def registrar_usuario(
         "message": "Usuario creado exitosamente"
     }
 
-@router.get("/usuarios", response_model=List[dict])
+@router.get("/usuarios", response_model=List[schemas.UserOut])
 def listar_usuarios(
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_admin_role)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.check_admin_role)
 ):
     """Lista todos los usuarios del sistema (solo admin)"""
-    usuarios = db.query(models.User).all()
+    # Solo las columnas necesarias: no se hidratan objetos User ni se lee password_hash
+    usuarios = db.query(models.User.id, models.User.username, models.User.role, models.User.status).all()
     return [
         {
             "id": u.id,
@@ -1,24 +1,54 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from typing import List
-from .. import models, schemas, auth, database
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from sqlalchemy.orm import Session, raiseload
+from sqlalchemy import and_, or_, insert, update
+from pydantic import TypeAdapter
+from typing import List, Optional
+from datetime import datetime
+from .. import models, schemas, auth, database, streaming
 
 router = APIRouter(prefix="/inventario", tags=["Inventario"])
 
+_movimientos_json = TypeAdapter(List[schemas.MovementResponse])
+
+def _paginar_movimientos(query, limit: Optional[int], before_ts: Optional[datetime], before_id: Optional[int]):
+    """Aplica paginación keyset (created_at, id) descendente a una consulta de movimientos.
+
+    Mismo contrato que los listados de ventas: sin limit se devuelven todas las
+    filas; para pedir la página siguiente el cliente envía created_at e id del
+    último movimiento recibido.
+    """
+    if before_ts is not None:
+        if before_id is not None:
+            query = query.filter(or_(
+                models.Movement.created_at < before_ts,
+                and_(models.Movement.created_at == before_ts, models.Movement.id < before_id)
+            ))
+        else:
+            query = query.filter(models.Movement.created_at < before_ts)
+
+    # MovementResponse no usa product ni user, así que no se cargan
+    query = query.options(raiseload("*")).order_by(
+        models.Movement.created_at.desc(), models.Movement.id.desc()
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
 # --- VISTA DE STOCK ACTUAL (Vendedor y Admin) ---
 @router.get("/stock", response_model=List[schemas.StockSchema])
 def ver_stock_actual(
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.get_current_user)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Obtiene el stock actual de todos los productos"""
-    return db.query(models.Stock).all()
+    # StockSchema solo lee columnas propias; raiseload evita cargas perezosas por fila
+    return db.query(models.Stock).options(raiseload("*")).all()
 
 @router.get("/stock/{product_id}", response_model=schemas.StockSchema)
 def obtener_stock_producto(
     product_id: int,
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.get_current_user)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Obtiene el stock de un producto específico"""
     stock = db.query(models.Stock).filter(models.Stock.product_id == product_id).first()
@@ -30,70 +60,93 @@ def obtener_stock_producto(
 @router.post("/movimiento", response_model=schemas.MovementResponse)
 def registrar_movimiento(
     movimiento: schemas.MovementCreate,
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.get_current_user)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Registra un movimiento de ingreso o egreso de inventario"""
-    # 1. Verificar si el producto existe
-    db_stock = db.query(models.Stock).filter(models.Stock.product_id == movimiento.product_id).first()
-    if not db_stock:
-        raise HTTPException(status_code=404, detail="El producto no tiene registro de stock")
-
-    # 2. Validar permisos: Solo ADMIN puede hacer INGRESOS
-    if movimiento.type == schemas.MovementType.INGRESO and current_user["role"] != "admin":
+    # 1. Validar permisos: Solo ADMIN puede hacer INGRESOS
+    if movimiento.type == schemas.MovementType.INGRESO and current_user.role != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN, 
             detail="Solo el administrador puede registrar ingresos de mercancía"
         )
 
-    # 3. Validar stock suficiente si es un EGRESO
+    # 2. Actualizar el stock en una sola sentencia atómica. Para un EGRESO la
+    #    condición current_quantity >= cantidad se evalúa en la base de datos,
+    #    así dos egresos concurrentes no pueden dejar el stock en negativo.
+    stmt = update(models.Stock).where(models.Stock.product_id == movimiento.product_id)
     if movimiento.type == schemas.MovementType.EGRESO:
-        if db_stock.current_quantity < movimiento.quantity:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Stock insuficiente. Disponible: {db_stock.current_quantity}"
-            )
-        db_stock.current_quantity -= movimiento.quantity
+        stmt = stmt.where(models.Stock.current_quantity >= movimiento.quantity).values(
+            current_quantity=models.Stock.current_quantity - movimiento.quantity
+        )
     else:
         # Es un INGRESO
-        db_stock.current_quantity += movimiento.quantity
+        stmt = stmt.values(current_quantity=models.Stock.current_quantity + movimiento.quantity)
 
-    # 4. Obtener el ID del usuario que está operando
-    user_record = db.query(models.User).filter(models.User.username == current_user["username"]).first()
+    nueva_cantidad = db.execute(
+        stmt.returning(models.Stock.current_quantity).execution_options(synchronize_session=False)
+    ).scalar()
 
-    # 5. Crear el registro del movimiento para auditoría
-    nuevo_movimiento = models.Movement(
-        product_id=movimiento.product_id,
-        user_id=user_record.id,
-        quantity=movimiento.quantity,
-        type=movimiento.type.value.upper(),  # Guardar como INGRESO o EGRESO
-        observation=movimiento.observation,
-        status=True
-    )
-    
-    db.add(nuevo_movimiento)
+    # 3. Ninguna fila actualizada: no hay stock para el producto o no alcanza
+    if nueva_cantidad is None:
+        disponible = db.query(models.Stock.current_quantity).filter(
+            models.Stock.product_id == movimiento.product_id
+        ).scalar()
+        if disponible is None:
+            raise HTTPException(status_code=404, detail="El producto no tiene registro de stock")
+        raise HTTPException(
+            status_code=400, 
+            detail=f"Stock insuficiente. Disponible: {disponible}"
+        )
+
+    # 4. Obtener el ID del usuario que está operando (viene en el token)
+    user_id = current_user.user_id
+    if user_id is None:
+        # Tokens emitidos antes de incluir 'uid'
+        user_id = db.query(models.User.id).filter(models.User.username == current_user.username).scalar()
+
+    # 5. Crear el registro del movimiento para auditoría. RETURNING trae id y
+    #    created_at en el mismo INSERT, sin un SELECT posterior.
+    datos_movimiento = {
+        "product_id": movimiento.product_id,
+        "user_id": user_id,
+        "quantity": movimiento.quantity,
+        "type": models.MovementType(movimiento.type.value),  # Se guarda como INGRESO o EGRESO
+        "observation": movimiento.observation,
+        "status": True
+    }
+    creado = db.execute(
+        insert(models.Movement).values(**datos_movimiento).returning(models.Movement.id, models.Movement.created_at)
+    ).one()
     db.commit()
-    db.refresh(db_stock)
-    db.refresh(nuevo_movimiento)
     
-    return nuevo_movimiento
+    return {**datos_movimiento, "id": creado.id, "created_at": creado.created_at, "updated_at": None}
 
 # --- HISTORIAL DE MOVIMIENTOS (Solo Admin) ---
 @router.get("/historial", response_model=List[schemas.MovementResponse])
 def ver_historial_completo(
+    # Scope por defecto: la sesión debe seguir abierta mientras se envía el streaming
     db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_admin_role)
+    current_user: auth.Principal = Depends(auth.check_admin_role),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Máximo de movimientos a devolver"),
+    before_ts: Optional[datetime] = Query(None, description="created_at del último movimiento recibido"),
+    before_id: Optional[int] = Query(None, description="id del último movimiento recibido")
 ):
-    """Obtiene el historial completo de movimientos de inventario"""
-    return db.query(models.Movement).order_by(models.Movement.created_at.desc()).all()
+    """Obtiene el historial de movimientos de inventario, del más reciente al más antiguo, opcionalmente paginado"""
+    return streaming.stream_json(
+        _paginar_movimientos(db.query(models.Movement), limit, before_ts, before_id), _movimientos_json
+    )
 
 @router.get("/historial/producto/{product_id}", response_model=List[schemas.MovementResponse])
 def ver_historial_producto(
     product_id: int,
+    # Scope por defecto: la sesión debe seguir abierta mientras se envía el streaming
     db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_admin_role)
+    current_user: auth.Principal = Depends(auth.check_admin_role),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Máximo de movimientos a devolver"),
+    before_ts: Optional[datetime] = Query(None, description="created_at del último movimiento recibido"),
+    before_id: Optional[int] = Query(None, description="id del último movimiento recibido")
 ):
-    """Obtiene el historial de movimientos de un producto específico"""
-    return db.query(models.Movement).filter(
-        models.Movement.product_id == product_id
-    ).order_by(models.Movement.created_at.desc()).all()
\ No newline at end of file
+    """Obtiene el historial de movimientos de un producto específico, opcionalmente paginado"""
+    query = db.query(models.Movement).filter(models.Movement.product_id == product_id)
+    return streaming.stream_json(_paginar_movimientos(query, limit, before_ts, before_id), _movimientos_json)
\ No newline at end of file
@@ -1,43 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from pydantic import TypeAdapter
+from sqlalchemy import exists, insert, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from typing import List
 
+from app import cache
 from app.database import get_db
 from app.models import Presentation, Product, UnitMeasure
-from app.schemas import PresentationCreate, PresentationUpdate, PresentationResponse, UnitMeasureCreate, UnitMeasureResponse
-from app.auth import get_current_user, check_admin_role
+from app.schemas import MessageResponse, PresentationCreate, PresentationUpdate, PresentationResponse, UnitMeasureCreate, UnitMeasureResponse
+from app.auth import Principal, get_current_user, check_admin_role
 
 router = APIRouter(prefix="/presentaciones", tags=["presentaciones"])
 
+_medidas = TypeAdapter(List[UnitMeasureResponse])
+
 # --- GESTIÓN DE MEDIDAS ---
 
 @router.get("/medidas", response_model=List[UnitMeasureResponse])
-def get_unit_measures(db: Session = Depends(get_db)):
+def get_unit_measures(request: Request, db: Session = Depends(get_db, scope="function")):
     """Obtener todas las medidas disponibles"""
-    measures = db.query(UnitMeasure).filter(UnitMeasure.status == True).all()
-    return measures
+    return cache.cached_json(
+        request, "medidas", "activas", _medidas,
+        lambda: db.query(UnitMeasure).filter(UnitMeasure.status == True).all()
+    )
 
 @router.post("/medidas", response_model=UnitMeasureResponse)
 def create_unit_measure(
     measure: UnitMeasureCreate,
-    db: Session = Depends(get_db),
-    current_user = Depends(check_admin_role)
+    db: Session = Depends(get_db, scope="function"),
+    current_user: Principal = Depends(check_admin_role)
 ):
     """Crear una nueva medida (solo admin)"""
     # Verificar que sea admin - ya validado por check_admin_role
     
-    # Verificar que no exista
-    existing = db.query(UnitMeasure).filter(
-        (UnitMeasure.name == measure.name) | (UnitMeasure.abbreviation == measure.abbreviation)
-    ).first()
-    
-    if existing:
+    # Las restricciones UNIQUE de name y abbreviation validan los duplicados en
+    # la misma sentencia INSERT, sin una consulta previa ni carreras entre peticiones
+    try:
+        new_measure = db.execute(
+            insert(UnitMeasure)
+            .values(name=measure.name, abbreviation=measure.abbreviation)
+            .returning(UnitMeasure.id, UnitMeasure.name, UnitMeasure.abbreviation)
+        ).one()
+        db.commit()
+    except IntegrityError:
+        db.rollback()
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="La medida ya existe")
     
-    new_measure = UnitMeasure(name=measure.name, abbreviation=measure.abbreviation)
-    db.add(new_measure)
-    db.commit()
-    db.refresh(new_measure)
+    cache.invalidate("medidas")
     return new_measure
 
 # --- GESTIÓN DE PRESENTACIONES ---
@@ -46,38 +56,43 @@ def create_unit_measure(
 def create_presentation(
     product_id: int,
     presentation: PresentationCreate,
-    db: Session = Depends(get_db),
-    current_user = Depends(check_admin_role)
+    db: Session = Depends(get_db, scope="function"),
+    current_user: Principal = Depends(check_admin_role)
 ):
     """Crear una presentación para un producto"""
     # Ya validado por check_admin_role
     
-    # Verificar que el producto existe
-    product = db.query(Product).filter(Product.id == product_id).first()
-    if not product:
+    # Verificar que el producto y la medida existen en una sola consulta
+    product_exists, measure_exists = db.execute(
+        select(
+            exists().where(Product.id == product_id),
+            exists().where(UnitMeasure.id == presentation.unit_measure_id)
+        )
+    ).one()
+    if not product_exists:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
-    # Verificar que la medida existe
-    measure = db.query(UnitMeasure).filter(UnitMeasure.id == presentation.unit_measure_id).first()
-    if not measure:
+    if not measure_exists:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Medida no encontrada")
     
     new_presentation = Presentation(
         product_id=product_id,
-        **presentation.dict()
+        **presentation.model_dump()
     )
     db.add(new_presentation)
     db.commit()
     db.refresh(new_presentation)
+    # El catálogo público incluye las presentaciones de cada producto
+    cache.invalidate("productos")
     return new_presentation
 
 @router.get("/productos/{product_id}/presentaciones", response_model=List[PresentationResponse])
 def get_product_presentations(
     product_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db, scope="function")
 ):
     """Obtener todas las presentaciones de un producto"""
-    product = db.query(Product).filter(Product.id == product_id).first()
+    product = db.get(Product, product_id)
     if not product:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Producto no encontrado")
     
@@ -89,10 +104,10 @@ def get_product_presentations(
 @router.get("/presentaciones/{presentation_id}", response_model=PresentationResponse)
 def get_presentation(
     presentation_id: int,
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_db, scope="function")
 ):
     """Obtener una presentación específica"""
-    presentation = db.query(Presentation).filter(Presentation.id == presentation_id).first()
+    presentation = db.get(Presentation, presentation_id)
     if not presentation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Presentación no encontrada")
     return presentation
@@ -101,37 +116,43 @@ def get_presentation(
 def update_presentation(
     presentation_id: int,
     presentation_update: PresentationUpdate,
-    db: Session = Depends(get_db),
-    current_user = Depends(check_admin_role)
+    db: Session = Depends(get_db, scope="function"),
+    current_user: Principal = Depends(check_admin_role)
 ):
     """Actualizar una presentación"""
     # Ya validado por check_admin_role
     
-    presentation = db.query(Presentation).filter(Presentation.id == presentation_id).first()
+    presentation = db.get(Presentation, presentation_id)
     if not presentation:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Presentación no encontrada")
     
-    update_data = presentation_update.dict(exclude_unset=True)
+    update_data = presentation_update.model_dump(exclude_unset=True)
     for field, value in update_data.items():
         setattr(presentation, field, value)
     
     db.commit()
     db.refresh(presentation)
+    cache.invalidate("productos")
     return presentation
 
-@router.delete("/presentaciones/{presentation_id}")
+@router.delete("/presentaciones/{presentation_id}", response_model=MessageResponse)
 def delete_presentation(
     presentation_id: int,
-    db: Session = Depends(get_db),
-    current_user = Depends(check_admin_role)
+    db: Session = Depends(get_db, scope="function"),
+    current_user: Principal = Depends(check_admin_role)
 ):
     """Eliminar una presentación (soft delete)"""
     # Ya validado por check_admin_role
     
-    presentation = db.query(Presentation).filter(Presentation.id == presentation_id).first()
-    if not presentation:
+    resultado = db.execute(
+        update(Presentation)
+        .where(Presentation.id == presentation_id)
+        .values(status=False)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount == 0:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Presentación no encontrada")
     
-    presentation.status = False
     db.commit()
+    cache.invalidate("productos")
     return {"message": "Presentación eliminada"}
@@ -1,50 +1,84 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from pydantic import TypeAdapter
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from typing import List
-from .. import models, schemas, auth, database
+from typing import List, Optional
+from .. import models, schemas, auth, database, cache, streaming
 
 router = APIRouter(prefix="/productos", tags=["Productos"])
 
+_productos_publicos = TypeAdapter(List[schemas.ProductPublic])
+_productos_admin = TypeAdapter(List[schemas.ProductAdmin])
+
+def _paginar_productos(query, limit: Optional[int], after_id: Optional[int]):
+    """Aplica paginación keyset por id ascendente; sin limit devuelve todas las filas"""
+    if after_id is not None:
+        query = query.filter(models.Product.id > after_id)
+    query = query.order_by(models.Product.id)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
 # --- VISTA PÚBLICA: Clientes ---
 @router.get("/", response_model=List[schemas.ProductPublic])
-def listar_productos_publico(db: Session = Depends(database.get_db)):
-    """Lista todos los productos activos para clientes"""
-    return db.query(models.Product).filter(models.Product.status == True).all()
+def listar_productos_publico(
+    request: Request,
+    db: Session = Depends(database.get_db, scope="function"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Máximo de productos a devolver"),
+    after_id: Optional[int] = Query(None, description="id del último producto recibido")
+):
+    """Lista los productos activos para clientes, opcionalmente paginados"""
+    query = db.query(models.Product).filter(models.Product.status == True)
+    # Las páginas se consultan directamente: limit y after_id los elige el cliente
+    # y cachearlas desplazaría el listado completo de la caché
+    if limit is not None or after_id is not None:
+        return _paginar_productos(query, limit, after_id).all()
+
+    # El listado completo se guarda serializado en la caché (uno por worker y por
+    # TTL), así que no se envía en streaming: su tamaño es el del catálogo activo
+    return cache.cached_json(
+        request, "productos", "activos", _productos_publicos,
+        lambda: _paginar_productos(query, None, None).all()
+    )
 
 @router.get("/{product_id}", response_model=schemas.ProductPublic)
-def obtener_producto_publico(product_id: int, db: Session = Depends(database.get_db)):
+def obtener_producto_publico(product_id: int, db: Session = Depends(database.get_db, scope="function")):
     """Obtiene un producto específico para clientes"""
-    producto = db.query(models.Product).filter(
-        models.Product.id == product_id,
-        models.Product.status == True
-    ).first()
-    if not producto:
+    producto = db.get(models.Product, product_id)
+    if not producto or not producto.status:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     return producto
 
 @router.get("/categoria/{cat_name}", response_model=List[schemas.ProductPublic])
-def listar_por_categoria(cat_name: str, db: Session = Depends(database.get_db)):
+def listar_por_categoria(cat_name: str, request: Request, db: Session = Depends(database.get_db, scope="function")):
     """Lista productos por categoría para clientes"""
-    return db.query(models.Product).filter(
-        models.Product.category == cat_name, 
-        models.Product.status == True
-    ).all()
+    return cache.cached_json(
+        request, "productos", ("categoria", cat_name), _productos_publicos,
+        lambda: db.query(models.Product).filter(
+            models.Product.category == cat_name, 
+            models.Product.status == True
+        ).all(),
+        variant=True
+    )
 
 # --- VISTA PRIVADA: Admin ---
 @router.get("/admin/all", response_model=List[schemas.ProductAdmin])
 def listar_productos_admin(
+    # Scope por defecto: la sesión debe seguir abierta mientras se envía el streaming
     db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_vendedor_role)
+    current_user: auth.Principal = Depends(auth.check_vendedor_role),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Máximo de productos a devolver"),
+    after_id: Optional[int] = Query(None, description="id del último producto recibido")
 ):
     """Lista todos los productos (activos e inactivos) para administradores"""
-    from sqlalchemy.orm import joinedload
-    return db.query(models.Product).options(joinedload(models.Product.stock)).all()
+    # Product.stock usa lazy="selectin" en el modelo: se carga por cada lote
+    return streaming.stream_json(_paginar_productos(db.query(models.Product), limit, after_id), _productos_admin)
 
 @router.post("/", response_model=schemas.ProductAdmin, status_code=status.HTTP_201_CREATED)
 def crear_producto(
     producto: schemas.ProductCreate,
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_admin_role)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.check_admin_role)
 ):
     """Crea un nuevo producto (solo administrador)"""
     # Validar que no exista un producto con el mismo nombre
@@ -60,13 +94,14 @@ def crear_producto(
     # Crear el producto
     nuevo_producto = models.Product(**producto.model_dump())
     db.add(nuevo_producto)
-    db.commit()
-    db.refresh(nuevo_producto)
+    db.flush()
     
-    # Crear registro de stock automáticamente
+    # Crear registro de stock automáticamente, en la misma transacción
     nuevo_stock = models.Stock(product_id=nuevo_producto.id, current_quantity=0)
     db.add(nuevo_stock)
     db.commit()
+    db.refresh(nuevo_producto)
+    cache.invalidate("productos")
     
     return nuevo_producto
 
@@ -74,11 +109,11 @@ def crear_producto(
 def editar_producto(
     prod_id: int,
     producto_update: schemas.ProductUpdate,
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_admin_role)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.check_admin_role)
 ):
     """Edita un producto existente (solo administrador)"""
-    db_prod = db.query(models.Product).filter(models.Product.id == prod_id).first()
+    db_prod = db.get(models.Product, prod_id)
     if not db_prod:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
@@ -87,20 +122,26 @@ def editar_producto(
         setattr(db_prod, key, value)
     
     db.commit()
+    cache.invalidate("productos")
     db.refresh(db_prod)
     return db_prod
 
-@router.delete("/{product_id}")
+@router.delete("/{product_id}", response_model=schemas.DeactivatedResponse)
 def desactivar_producto(
     product_id: int, 
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_admin_role)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.check_admin_role)
 ):
     """Desactiva un producto (soft delete)"""
-    producto = db.query(models.Product).filter(models.Product.id == product_id).first()
-    if not producto:
+    resultado = db.execute(
+        update(models.Product)
+        .where(models.Product.id == product_id)
+        .values(status=False)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount == 0:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
     
-    producto.status = False
     db.commit()
+    cache.invalidate("productos")
     return {"message": "Producto desactivado exitosamente", "id": product_id}
\ No newline at end of file
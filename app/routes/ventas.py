@@ -1,56 +1,132 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import func, and_, or_, insert, delete, update
 from typing import List, Optional
-from datetime import datetime, date, timedelta
-from .. import models, schemas, auth, database
+from datetime import datetime, date, time, timedelta
+from .. import models, schemas, auth, database, cache, streaming
 
 router = APIRouter(prefix="/ventas", tags=["Ventas y Pedidos"])
 
+# Los items se cargan en una sola consulta IN (...); cualquier otra carga perezosa
+# (SaleItem.product, SaleItem.presentation) falla en lugar de generar N+1
+_CON_ITEMS = selectinload(models.Sale.items).raiseload("*")
+
+def _rango_dia(dia: date) -> tuple[datetime, datetime]:
+    """Rango semiabierto [inicio, fin) que cubre el día completo"""
+    inicio = datetime.combine(dia, time.min)
+    return inicio, inicio + timedelta(days=1)
+
+def _paginar_ventas(query, limit: Optional[int], before_ts: Optional[datetime], before_id: Optional[int]):
+    """Aplica paginación keyset (created_at, id) descendente a una consulta de ventas.
+
+    Sin limit se devuelven todas las filas (en streaming, por lotes); para pedir
+    la página siguiente el cliente envía created_at e id de la última venta recibida.
+    """
+    if before_ts is not None:
+        if before_id is not None:
+            query = query.filter(or_(
+                models.Sale.created_at < before_ts,
+                and_(models.Sale.created_at == before_ts, models.Sale.id < before_id)
+            ))
+        else:
+            query = query.filter(models.Sale.created_at < before_ts)
+
+    query = query.order_by(models.Sale.created_at.desc(), models.Sale.id.desc())
+    if limit is not None:
+        query = query.limit(limit)
+    return query
+
+_ventas_json = TypeAdapter(List[schemas.SaleResponse])
+_venta_json = TypeAdapter(schemas.SaleResponse)
+_resumen_json = TypeAdapter(schemas.SalesSummaryStats)
+_por_producto_json = TypeAdapter(List[schemas.ProductSalesStats])
+_serie_json = TypeAdapter(schemas.SalesSeriesStats)
+
+def _stream_ventas(query, ndjson: bool = False) -> StreamingResponse:
+    """Envía las ventas en streaming, cargándolas por lotes.
+
+    Por defecto como arreglo JSON; con ndjson=True una venta por línea
+    (application/x-ndjson), útil para exportaciones.
+    """
+    if not ndjson:
+        return streaming.stream_json(query, _ventas_json)
+
+    def serializar_lineas(lote) -> bytes:
+        ventas = _ventas_json.validate_python(lote, from_attributes=True)
+        return b"".join(_venta_json.dump_json(venta) + b"\n" for venta in ventas)
+
+    return StreamingResponse(
+        (serializar_lineas(lote) for lote in streaming.por_lotes(query)), media_type="application/x-ndjson"
+    )
+
+def _rango_periodo(
+    periodo: str, fecha_inicio: Optional[str], fecha_fin: Optional[str]
+) -> Optional[tuple[datetime, datetime]]:
+    """Rango semiabierto [inicio, fin) de un período de estadísticas; None si abarca todo"""
+    hoy = date.today()
+    if periodo == "hoy":
+        return _rango_dia(hoy)
+    if periodo == "semana":
+        return _rango_dia(hoy - timedelta(days=hoy.weekday()))[0], _rango_dia(hoy)[1]
+    if periodo == "mes":
+        siguiente = date(hoy.year + 1, 1, 1) if hoy.month == 12 else date(hoy.year, hoy.month + 1, 1)
+        return _rango_dia(hoy.replace(day=1))[0], _rango_dia(siguiente)[0]
+    if fecha_inicio and fecha_fin:
+        try:
+            return _rango_dia(date.fromisoformat(fecha_inicio))[0], _rango_dia(date.fromisoformat(fecha_fin))[1]
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Formato de fecha inválido")
+    return None
+
+def _clave_estadistica(
+    nombre: str, periodo: str, fecha_inicio: Optional[str], fecha_fin: Optional[str]
+) -> tuple[tuple, bool]:
+    """Clave de caché de una estadística y si corresponde a un rango arbitrario.
+
+    Los períodos fijos usan una clave normalizada (las fechas no influyen); los
+    rangos elegidos por el cliente van a la caché de variantes.
+    """
+    hoy = date.today()
+    if periodo in ("hoy", "semana", "mes") or (periodo == "todo" and not (fecha_inicio and fecha_fin)):
+        return (nombre, periodo, hoy), False
+    return (nombre, periodo, fecha_inicio, fecha_fin, hoy), True
+
+def _filas_items(sale_id: int, items: List[schemas.SaleItemSchema]) -> List[dict]:
+    """Convierte los items del pedido en filas para un INSERT multi-fila"""
+    return [
+        {
+            "sale_id": sale_id,
+            "product_id": item.product_id,
+            "presentation_id": item.presentation_id,
+            "product_name": item.product_name,
+            "presentation_description": item.presentation_description,
+            "quantity": item.quantity,
+            "price_at_time": item.price_at_time,
+        }
+        for item in items
+    ]
+
 # --- CREAR PEDIDO (Cliente o Vendedor) ---
 @router.post("/pedido-nuevo", response_model=schemas.SaleResponse)
 def crear_pedido_cliente(
-    pedido: schemas.SaleCreate, 
-    db: Session = Depends(database.get_db)
+    pedido: schemas.SaleCreate,
+    db: Session = Depends(database.get_db, scope="function")
 ):
     """Crea un nuevo pedido con items asociados"""
-    # Validar datos básicos
-    if not pedido.client_name or not pedido.client_phone:
-        raise HTTPException(
-            status_code=400,
-            detail="Nombre y teléfono del cliente son requeridos"
-        )
-    
-    if len(pedido.items) == 0:
-        raise HTTPException(
-            status_code=400,
-            detail="El pedido debe contener al menos un producto"
-        )
-    
-    # Crear la cabecera de la venta
+    # Cabecera e items se guardan juntos al confirmar: el flush inserta la venta
+    # y luego todos sus items en un INSERT multi-fila
     nuevo_pedido = models.Sale(
         client_name=pedido.client_name,
         client_phone=pedido.client_phone,
         client_address=pedido.client_address,
         total_estimated=pedido.total_estimated,
         observations=pedido.observations,
-        status=True 
+        status=True,
+        items=[models.SaleItem(**item.model_dump()) for item in pedido.items]
     )
     db.add(nuevo_pedido)
-    db.flush() 
-
-    # Guardar los detalles de los productos
-    for item in pedido.items:
-        detalle_producto = models.SaleItem(
-            sale_id=nuevo_pedido.id,
-            product_id=item.product_id,
-            presentation_id=item.presentation_id,
-            product_name=item.product_name,
-            presentation_description=item.presentation_description,
-            quantity=item.quantity,
-            price_at_time=item.price_at_time
-        )
-        db.add(detalle_producto)
 
     try:
         db.commit()
@@ -58,80 +134,94 @@ def crear_pedido_cliente(
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail="Error al registrar los productos del pedido")
-        
+    
+    cache.invalidate("ventas")
     return nuevo_pedido
 
 # --- LISTAR PEDIDOS ---
 @router.get("/listado", response_model=List[schemas.SaleResponse])
 def listar_pedidos(
+    # Scope por defecto: la sesión debe seguir abierta mientras se envía el streaming
     db: Session = Depends(database.get_db),
-    current_user = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Máximo de ventas a devolver"),
+    before_ts: Optional[datetime] = Query(None, description="created_at de la última venta recibida"),
+    before_id: Optional[int] = Query(None, description="id de la última venta recibida")
 ):
-    """Lista todos los pedidos ordenados por fecha"""
-    return db.query(models.Sale).order_by(models.Sale.created_at.desc()).all()
+    """Lista los pedidos ordenados por fecha, opcionalmente paginados"""
+    query = db.query(models.Sale).options(_CON_ITEMS)
+    return _stream_ventas(_paginar_ventas(query, limit, before_ts, before_id))
 
 @router.get("/pedidos-pendientes", response_model=List[schemas.SaleResponse])
 def obtener_pedidos_pendientes(
+    # Scope por defecto: la sesión debe seguir abierta mientras se envía el streaming
     db: Session = Depends(database.get_db),
-    current_user = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Máximo de ventas a devolver"),
+    before_ts: Optional[datetime] = Query(None, description="created_at de la última venta recibida"),
+    before_id: Optional[int] = Query(None, description="id de la última venta recibida")
 ):
     """Obtiene solo los pedidos pendientes (status=True)"""
-    return db.query(models.Sale).filter(models.Sale.status == True).order_by(
-        models.Sale.created_at.desc()
-    ).all()
+    # Sin caché: es la cola de trabajo de los vendedores y debe reflejar cada
+    # despacho al instante, también entre distintos workers
+    query = db.query(models.Sale).options(_CON_ITEMS).filter(models.Sale.status == True)
+    return _stream_ventas(_paginar_ventas(query, limit, before_ts, before_id))
 
 @router.get("/ventas-hoy", response_model=List[schemas.SaleResponse])
 def obtener_ventas_hoy(
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.get_current_user)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Obtiene solo las ventas del día actual"""
-    hoy = date.today()
-    inicio_dia = datetime.combine(hoy, datetime.min.time())
-    fin_dia = datetime.combine(hoy, datetime.max.time())
+    inicio_dia, fin_dia = _rango_dia(date.today())
     
-    return db.query(models.Sale).filter(
+    return db.query(models.Sale).options(_CON_ITEMS).filter(
         and_(
             models.Sale.created_at >= inicio_dia,
-            models.Sale.created_at <= fin_dia
+            models.Sale.created_at < fin_dia
         )
     ).order_by(models.Sale.created_at.desc()).all()
 
 @router.get("/historial", response_model=List[schemas.SaleResponse])
 def obtener_historial_ventas(
+    request: Request,
+    # Scope por defecto: la sesión debe seguir abierta mientras se envía el streaming
     db: Session = Depends(database.get_db),
-    current_user = Depends(auth.get_current_user),
-    fecha: Optional[str] = Query(None, description="Fecha en formato YYYY-MM-DD")
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    fecha: Optional[str] = Query(None, description="Fecha en formato YYYY-MM-DD"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Máximo de ventas a devolver"),
+    before_ts: Optional[datetime] = Query(None, description="created_at de la última venta recibida"),
+    before_id: Optional[int] = Query(None, description="id de la última venta recibida")
 ):
-    """Obtiene historial de ventas, opcionalmente filtrado por fecha"""
-    query = db.query(models.Sale)
+    """Obtiene historial de ventas, opcionalmente filtrado por fecha y paginado"""
+    query = db.query(models.Sale).options(_CON_ITEMS)
     
     if fecha:
         try:
-            fecha_obj = datetime.strptime(fecha, "%Y-%m-%d").date()
-            inicio_dia = datetime.combine(fecha_obj, datetime.min.time())
-            fin_dia = datetime.combine(fecha_obj, datetime.max.time())
-            query = query.filter(
-                and_(
-                    models.Sale.created_at >= inicio_dia,
-                    models.Sale.created_at <= fin_dia
-                )
-            )
+            inicio_dia, fin_dia = _rango_dia(date.fromisoformat(fecha))
         except ValueError:
             raise HTTPException(status_code=400, detail="Formato de fecha inválido. Use YYYY-MM-DD")
+        query = query.filter(
+            and_(
+                models.Sale.created_at >= inicio_dia,
+                models.Sale.created_at < fin_dia
+            )
+        )
     
-    return query.order_by(models.Sale.created_at.desc()).all()
+    # Con "Accept: application/x-ndjson" se devuelve una venta por línea
+    ndjson = "application/x-ndjson" in request.headers.get("accept", "")
+    return _stream_ventas(_paginar_ventas(query, limit, before_ts, before_id), ndjson=ndjson)
 
 # --- ACTUALIZAR PEDIDO ---
 @router.put("/actualizar/{pedido_id}", response_model=schemas.SaleResponse)
 def actualizar_pedido(
     pedido_id: int,
     pedido_actualizado: schemas.SaleCreate,
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.get_current_user)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Actualiza un pedido permitiendo modificar items, cantidades y precios"""
-    pedido = db.query(models.Sale).filter(models.Sale.id == pedido_id).first()
+    pedido = db.get(models.Sale, pedido_id)
     if not pedido:
         raise HTTPException(status_code=404, detail="Pedido no encontrado")
     
@@ -145,140 +235,157 @@ def actualizar_pedido(
     pedido.total_estimated = total_calculado
     pedido.observations = pedido_actualizado.observations
     
-    # Eliminar items antiguos
-    db.query(models.SaleItem).filter(models.SaleItem.sale_id == pedido_id).delete()
-    
-    # Agregar nuevos items
-    for item in pedido_actualizado.items:
-        nuevo_item = models.SaleItem(
-            sale_id=pedido_id,
-            product_id=item.product_id,
-            product_name=item.product_name,
-            quantity=item.quantity,
-            price_at_time=item.price_at_time
-        )
-        db.add(nuevo_item)
-    
     try:
+        # Reemplazar los items antiguos por los nuevos
+        db.execute(delete(models.SaleItem).where(models.SaleItem.sale_id == pedido_id))
+        # SaleCreate exige al menos un item (Field(min_length=1))
+        db.execute(insert(models.SaleItem), _filas_items(pedido_id, pedido_actualizado.items))
         db.commit()
         db.refresh(pedido)
+        cache.invalidate("ventas")
         return pedido
     except Exception as e:
         db.rollback()
         raise HTTPException(status_code=500, detail="Error al actualizar el pedido")
 
 # --- DESPACHAR PEDIDO ---
-@router.post("/despachar/{pedido_id}")
+@router.post("/despachar/{pedido_id}", response_model=schemas.DispatchResponse)
 def despachar_pedido(
     pedido_id: int,
     productos_a_descontar: List[schemas.MovementCreate],
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.get_current_user),
     desde_modulo_venta: bool = Query(False)
 ):
     """Despacha un pedido y actualiza el inventario"""
-    # Verificar el pedido
-    pedido = db.query(models.Sale).filter(models.Sale.id == pedido_id).first()
-    if not pedido:
-        raise HTTPException(status_code=404, detail="Pedido no encontrado")
+    # Cargar en bloque los items y productos involucrados (evita N+1)
+    ids = [item.product_id for item in productos_a_descontar]
+    sale_items = {
+        si.product_id: si
+        for si in db.query(
+            models.SaleItem.id, models.SaleItem.product_id, models.SaleItem.price_at_time
+        ).filter(
+            and_(models.SaleItem.sale_id == pedido_id, models.SaleItem.product_id.in_(ids))
+        ).all()
+    }
+    # Precio unitario por producto: el del item del pedido y, si el producto no
+    # estaba en el pedido, su precio de venta actual (solo se consultan esas columnas)
+    precios = {pid: si.price_at_time for pid, si in sale_items.items()}
+    ids_sin_item = [pid for pid in ids if pid not in precios]
+    if ids_sin_item:
+        precios.update(
+            db.query(models.Product.id, models.Product.sale_price)
+            .filter(models.Product.id.in_(ids_sin_item))
+            .all()
+        )
+
+    # Calcular nuevo total en memoria, sin consultas adicionales
+    nuevo_total = sum(
+        (precios.get(item.product_id) or 0.0) * item.quantity
+        for item in productos_a_descontar
+    )
     
-    # Calcular nuevo total
-    nuevo_total = 0.0
-    for item in productos_a_descontar:
-        sale_item = db.query(models.SaleItem).filter(
-            and_(models.SaleItem.sale_id == pedido_id, models.SaleItem.product_id == item.product_id)
-        ).first()
-        
-        if sale_item:
-            nuevo_total += sale_item.price_at_time * item.quantity
-        else:
-            producto = db.query(models.Product).filter(models.Product.id == item.product_id).first()
-            if producto:
-                nuevo_total += producto.sale_price * item.quantity
+    # Cerrar el pedido con el nuevo total, solo si sigue pendiente: un pedido ya
+    # despachado (o despachado a la vez desde otra sesión) no vuelve a descontar stock
+    resultado = db.execute(
+        update(models.Sale)
+        .where(models.Sale.id == pedido_id, models.Sale.status == True)
+        .values(total_estimated=nuevo_total, status=False)
+        .execution_options(synchronize_session=False)
+    )
+    if resultado.rowcount == 0:
+        db.rollback()
+        if db.get(models.Sale, pedido_id) is None:
+            raise HTTPException(status_code=404, detail="Pedido no encontrado")
+        raise HTTPException(status_code=400, detail="El pedido ya fue despachado")
     
-    # Obtener usuario actual
-    user_record = db.query(models.User).filter(models.User.username == current_user["username"]).first()
+    # ID del usuario que despacha (viene en el token)
+    user_id = current_user.user_id
+    if user_id is None:
+        # Tokens emitidos antes de incluir 'uid'
+        user_id = db.query(models.User.id).filter(models.User.username == current_user.username).scalar()
     
     # Descontar cada producto del inventario
+    movimientos = []
+    cantidades_items = []
     for item in productos_a_descontar:
-        db_stock = db.query(models.Stock).filter(models.Stock.product_id == item.product_id).first()
+        # Restar stock en un solo UPDATE atómico: si no hay fila con stock
+        # suficiente no se devuelve nada y se revierte todo el despacho
+        nueva_cantidad = db.execute(
+            update(models.Stock)
+            .where(
+                models.Stock.product_id == item.product_id,
+                models.Stock.current_quantity >= item.quantity
+            )
+            .values(current_quantity=models.Stock.current_quantity - item.quantity)
+            .returning(models.Stock.current_quantity)
+            .execution_options(synchronize_session=False)
+        ).scalar()
         
-        if not db_stock or db_stock.current_quantity < item.quantity:
+        if nueva_cantidad is None:
             db.rollback()
             raise HTTPException(
                 status_code=400, 
                 detail=f"No hay suficiente stock para el producto ID {item.product_id}"
             )
         
-        # Restar stock
-        db_stock.current_quantity -= item.quantity
-        
         # Registrar el movimiento de egreso
-        movimiento = models.Movement(
-            product_id=item.product_id,
-            user_id=user_record.id,
-            quantity=item.quantity,
-            type=models.MovementType.EGRESO.value.upper(),
-            observation=f"Despacho pedido #{pedido_id}"
-        )
-        db.add(movimiento)
+        movimientos.append({
+            "product_id": item.product_id,
+            "user_id": user_id,
+            "quantity": item.quantity,
+            "type": models.MovementType.EGRESO,
+            "observation": f"Despacho pedido #{pedido_id}",
+        })
         
-        # Actualizar items del pedido
-        sale_item = db.query(models.SaleItem).filter(
-            and_(models.SaleItem.sale_id == pedido_id, models.SaleItem.product_id == item.product_id)
-        ).first()
+        # Cantidad despachada para el item del pedido
+        sale_item = sale_items.get(item.product_id)
         if sale_item:
-            sale_item.quantity = item.quantity
+            cantidades_items.append({"id": sale_item.id, "quantity": item.quantity})
+
+    # Insertar todos los movimientos en un solo INSERT multi-fila
+    if movimientos:
+        db.execute(insert(models.Movement), movimientos)
+
+    # Actualizar los items del pedido por clave primaria en un solo executemany
+    if cantidades_items:
+        db.execute(update(models.SaleItem), cantidades_items)
 
-    # Actualizar total del pedido
-    pedido.total_estimated = nuevo_total
-    pedido.status = False
-    
     db.commit()
+    cache.invalidate("ventas")
     
     return {"message": "Pedido despachado e inventario actualizado", "total_actualizado": nuevo_total}
 
 # --- ESTADÍSTICAS ---
-@router.get("/estadisticas/resumen")
+@router.get("/estadisticas/resumen", response_model=schemas.SalesSummaryStats)
 def obtener_estadisticas_resumen(
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_admin_role),
+    request: Request,
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.check_admin_role),
     periodo: str = Query("hoy", description="hoy, semana, mes, todo"),
     fecha_inicio: Optional[str] = Query(None, description="YYYY-MM-DD"),
     fecha_fin: Optional[str] = Query(None, description="YYYY-MM-DD")
 ):
     """Obtiene estadísticas de ventas filtradas por período (solo admin)"""
+    # La fecha forma parte de la clave: "hoy", "semana" y "mes" cambian con el día
+    clave, variante = _clave_estadistica("resumen", periodo, fecha_inicio, fecha_fin)
+    return cache.cached_json(
+        request, "ventas", clave, _resumen_json,
+        lambda: _calcular_resumen(db, periodo, fecha_inicio, fecha_fin),
+        private=True, variant=variante
+    )
+
+def _calcular_resumen(db: Session, periodo: str, fecha_inicio: Optional[str], fecha_fin: Optional[str]) -> dict:
+    """Totales de ventas del período"""
     query = db.query(
         func.count(models.Sale.id).label("total_pedidos"),
         func.sum(models.Sale.total_estimated).label("total_vendido"),
         func.avg(models.Sale.total_estimated).label("promedio_pedido")
     )
     
-    if periodo == "hoy":
-        hoy = date.today()
-        inicio = datetime.combine(hoy, datetime.min.time())
-        fin = datetime.combine(hoy, datetime.max.time())
-        query = query.filter(and_(models.Sale.created_at >= inicio, models.Sale.created_at <= fin))
-    elif periodo == "semana":
-        hoy = date.today()
-        inicio = datetime.combine(hoy - timedelta(days=hoy.weekday()), datetime.min.time())
-        fin = datetime.combine(hoy, datetime.max.time())
-        query = query.filter(and_(models.Sale.created_at >= inicio, models.Sale.created_at <= fin))
-    elif periodo == "mes":
-        hoy = date.today()
-        inicio = datetime.combine(date(hoy.year, hoy.month, 1), datetime.min.time())
-        if hoy.month == 12:
-            fin = datetime.combine(date(hoy.year + 1, 1, 1) - timedelta(days=1), datetime.max.time())
-        else:
-            fin = datetime.combine(date(hoy.year, hoy.month + 1, 1) - timedelta(days=1), datetime.max.time())
-        query = query.filter(and_(models.Sale.created_at >= inicio, models.Sale.created_at <= fin))
-    elif fecha_inicio and fecha_fin:
-        try:
-            inicio = datetime.strptime(fecha_inicio, "%Y-%m-%d").replace(hour=0, minute=0, second=0)
-            fin = datetime.strptime(fecha_fin, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
-            query = query.filter(and_(models.Sale.created_at >= inicio, models.Sale.created_at <= fin))
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Formato de fecha inválido")
+    rango = _rango_periodo(periodo, fecha_inicio, fecha_fin)
+    if rango:
+        query = query.filter(and_(models.Sale.created_at >= rango[0], models.Sale.created_at < rango[1]))
     
     resultado = query.first()
     
@@ -289,50 +396,40 @@ def obtener_estadisticas_resumen(
         "periodo": periodo
     }
 
-@router.get("/estadisticas/por-producto")
+@router.get("/estadisticas/por-producto", response_model=List[schemas.ProductSalesStats])
 def obtener_estadisticas_por_producto(
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_admin_role),
+    request: Request,
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.check_admin_role),
     periodo: str = Query("mes", description="hoy, semana, mes, todo"),
     fecha_inicio: Optional[str] = Query(None, description="YYYY-MM-DD"),
     fecha_fin: Optional[str] = Query(None, description="YYYY-MM-DD")
 ):
     """Obtiene estadísticas de ventas por producto (solo admin)"""
+    clave, variante = _clave_estadistica("por-producto", periodo, fecha_inicio, fecha_fin)
+    return cache.cached_json(
+        request, "ventas", clave, _por_producto_json,
+        lambda: _calcular_por_producto(db, periodo, fecha_inicio, fecha_fin),
+        private=True, variant=variante
+    )
+
+def _calcular_por_producto(db: Session, periodo: str, fecha_inicio: Optional[str], fecha_fin: Optional[str]) -> List[dict]:
+    """Ventas agrupadas por producto en el período"""
+    ingresos = func.sum(models.SaleItem.quantity * models.SaleItem.price_at_time)
+    # Agrupar por product_id (el nombre copiado en el item puede variar entre ventas)
+    # y unir con sales antes de aplicar los filtros por fecha
     query = db.query(
-        models.SaleItem.product_name,
+        func.max(models.SaleItem.product_name).label("producto"),
         func.count(models.SaleItem.id).label("cantidad_vendida"),
         func.sum(models.SaleItem.quantity).label("unidades_totales"),
-        func.sum(models.SaleItem.quantity * models.SaleItem.price_at_time).label("ingresos")
-    ).group_by(models.SaleItem.product_name)
+        ingresos.label("ingresos")
+    ).join(models.Sale, models.Sale.id == models.SaleItem.sale_id).group_by(models.SaleItem.product_id)
     
-    # Filtrar por período
-    if periodo == "hoy":
-        hoy = date.today()
-        inicio = datetime.combine(hoy, datetime.min.time())
-        fin = datetime.combine(hoy, datetime.max.time())
-        query = query.filter(and_(models.Sale.created_at >= inicio, models.Sale.created_at <= fin))
-    elif periodo == "semana":
-        hoy = date.today()
-        inicio = datetime.combine(hoy - timedelta(days=hoy.weekday()), datetime.min.time())
-        fin = datetime.combine(hoy, datetime.max.time())
-        query = query.filter(and_(models.Sale.created_at >= inicio, models.Sale.created_at <= fin))
-    elif periodo == "mes":
-        hoy = date.today()
-        inicio = datetime.combine(date(hoy.year, hoy.month, 1), datetime.min.time())
-        if hoy.month == 12:
-            fin = datetime.combine(date(hoy.year + 1, 1, 1) - timedelta(days=1), datetime.max.time())
-        else:
-            fin = datetime.combine(date(hoy.year, hoy.month + 1, 1) - timedelta(days=1), datetime.max.time())
-        query = query.filter(and_(models.Sale.created_at >= inicio, models.Sale.created_at <= fin))
-    elif fecha_inicio and fecha_fin:
-        try:
-            inicio = datetime.strptime(fecha_inicio, "%Y-%m-%d").replace(hour=0, minute=0, second=0)
-            fin = datetime.strptime(fecha_fin, "%Y-%m-%d").replace(hour=23, minute=59, second=59)
-            query = query.filter(and_(models.Sale.created_at >= inicio, models.Sale.created_at <= fin))
-        except ValueError:
-            raise HTTPException(status_code=400, detail="Formato de fecha inválido")
+    rango = _rango_periodo(periodo, fecha_inicio, fecha_fin)
+    if rango:
+        query = query.filter(and_(models.Sale.created_at >= rango[0], models.Sale.created_at < rango[1]))
     
-    query = query.join(models.Sale).order_by(func.sum(models.SaleItem.quantity * models.SaleItem.price_at_time).desc())
+    query = query.order_by(ingresos.desc())
     
     resultados = query.all()
     
@@ -346,30 +443,79 @@ def obtener_estadisticas_por_producto(
         for r in resultados
     ]
 
-@router.get("/estadisticas/vendedor-hoy")
+@router.get("/estadisticas/serie", response_model=schemas.SalesSeriesStats)
+def obtener_estadisticas_serie(
+    request: Request,
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.check_admin_role),
+    periodo: str = Query("mes", description="hoy, semana, mes, todo"),
+    fecha_inicio: Optional[str] = Query(None, description="YYYY-MM-DD"),
+    fecha_fin: Optional[str] = Query(None, description="YYYY-MM-DD")
+):
+    """Obtiene los totales del período y su desglose por día (solo admin)"""
+    clave, variante = _clave_estadistica("serie", periodo, fecha_inicio, fecha_fin)
+    return cache.cached_json(
+        request, "ventas", clave, _serie_json,
+        lambda: _calcular_serie(db, periodo, fecha_inicio, fecha_fin),
+        private=True, variant=variante
+    )
+
+def _calcular_serie(db: Session, periodo: str, fecha_inicio: Optional[str], fecha_fin: Optional[str]) -> dict:
+    """Ventas agrupadas por día; los totales se suman sobre la serie, sin otra consulta"""
+    dia = func.date(models.Sale.created_at)
+    query = db.query(
+        dia.label("fecha"),
+        func.count(models.Sale.id).label("total_pedidos"),
+        func.coalesce(func.sum(models.Sale.total_estimated), 0).label("total_vendido")
+    ).group_by(dia).order_by(dia)
+    
+    rango = _rango_periodo(periodo, fecha_inicio, fecha_fin)
+    if rango:
+        query = query.filter(and_(models.Sale.created_at >= rango[0], models.Sale.created_at < rango[1]))
+    
+    serie = query.all()
+    total_pedidos = sum(d.total_pedidos for d in serie)
+    total_vendido = sum(d.total_vendido for d in serie)
+    
+    return {
+        "total_pedidos": total_pedidos,
+        "total_vendido": total_vendido,
+        "promedio_pedido": round(total_vendido / total_pedidos, 2) if total_pedidos else 0,
+        "periodo": periodo,
+        "serie": serie
+    }
+
+@router.get("/estadisticas/vendedor-hoy", response_model=schemas.SellerTodayStats)
 def obtener_venta_vendedor_hoy(
-    db: Session = Depends(database.get_db),
-    current_user = Depends(auth.check_vendedor_role)
+    db: Session = Depends(database.get_db, scope="function"),
+    current_user: auth.Principal = Depends(auth.check_vendedor_role),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Máximo de ventas en el detalle")
 ):
     """Obtiene el resumen de ventas del vendedor hoy"""
     hoy = date.today()
-    inicio = datetime.combine(hoy, datetime.min.time())
-    fin = datetime.combine(hoy, datetime.max.time())
+    inicio, fin = _rango_dia(hoy)
+    del_dia = and_(models.Sale.created_at >= inicio, models.Sale.created_at < fin)
     
-    ventas = db.query(models.Sale).filter(
-        and_(
-            models.Sale.created_at >= inicio,
-            models.Sale.created_at <= fin
-        )
-    ).all()
+    # Totales calculados en la base de datos
+    total_pedidos, total_vendido = db.query(
+        func.count(models.Sale.id),
+        func.coalesce(func.sum(models.Sale.total_estimated), 0)
+    ).filter(del_dia).one()
     
-    total_vendido = sum(v.total_estimated for v in ventas)
+    # Detalle: solo las columnas de SaleSummary, sin cargar entidades ni items
+    detalle = db.query(
+        models.Sale.id, models.Sale.status, models.Sale.created_at, models.Sale.updated_at,
+        models.Sale.client_name, models.Sale.client_phone, models.Sale.client_address,
+        models.Sale.total_estimated, models.Sale.observations
+    ).filter(del_dia).order_by(models.Sale.created_at.desc(), models.Sale.id.desc())
+    if limit is not None:
+        detalle = detalle.limit(limit)
     
     return {
-        "usuario": current_user["username"],
+        "usuario": current_user.username,
         "fecha": str(hoy),
-        "total_pedidos": len(ventas),
+        "total_pedidos": total_pedidos,
         "total_vendido": total_vendido,
-        "promedio_pedido": round(total_vendido / len(ventas), 2) if ventas else 0,
-        "detalle_ventas": ventas
+        "promedio_pedido": round(total_vendido / total_pedidos, 2) if total_pedidos else 0,
+        "detalle_ventas": detalle.all()
     }
@@ -1,5 +1,5 @@
-from pydantic import BaseModel, ConfigDict
-from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field
+from datetime import date, datetime
 from typing import Optional, List
 from enum import Enum
 
@@ -135,43 +135,96 @@ class SaleItemSchema(BaseModel):
     model_config = ConfigDict(from_attributes=True)
     
 class SaleCreate(BaseModel):
-    client_name: str
-    client_phone: str
+    # Nombre, teléfono y al menos un producto son obligatorios
+    client_name: str = Field(min_length=1)
+    client_phone: str = Field(min_length=1)
     client_address: str
     total_estimated: float
     observations: Optional[str] = None
     # --- AHORA RECIBE LA LISTA DE PRODUCTOS ---
-    items: List[SaleItemSchema] 
+    items: List[SaleItemSchema] = Field(min_length=1)
 
-class SaleResponse(BaseAuditSchema):
+# Cabecera de la venta, sin items
+class SaleSummary(BaseAuditSchema):
     id: int
     client_name: str
     client_phone: str
     client_address: str
     total_estimated: float
     observations: Optional[str] = None
+
+class SaleResponse(SaleSummary):
     # --- AHORA DEVUELVE LA LISTA DE PRODUCTOS AL FRONTEND ---
     items: List[SaleItemSchema] = []
 
     model_config = ConfigDict(from_attributes=True)
 
-class UserCreate(BaseModel):
-    username: str
-    password: str
-    role: UserRole
+class DispatchResponse(BaseModel):
+    message: str
+    total_actualizado: float
 
-class UserResponse(BaseModel):
+# --- RESPUESTAS SIMPLES ---
+class MessageResponse(BaseModel):
+    message: str
+
+class DeactivatedResponse(MessageResponse):
     id: int
-    username: str
-    role: UserRole
-    status: bool
 
-    model_config = ConfigDict(from_attributes=True)
+class HealthResponse(BaseModel):
+    status: str
+    message: str
+
+class ApiInfo(BaseModel):
+    nombre: str
+    version: str
+    docs: str
+
+# --- ESQUEMAS PARA ESTADÍSTICAS ---
+class SalesSummaryStats(BaseModel):
+    total_pedidos: int
+    total_vendido: float
+    promedio_pedido: float
+    periodo: str
+
+class SalesDayStats(BaseModel):
+    fecha: date
+    total_pedidos: int
+    total_vendido: float
+
+class SalesSeriesStats(SalesSummaryStats):
+    serie: List[SalesDayStats] = []
+
+class ProductSalesStats(BaseModel):
+    producto: str
+    cantidad_transacciones: int
+    unidades_totales: float
+    ingresos: float
+
+class SellerTodayStats(BaseModel):
+    usuario: str
+    fecha: str
+    total_pedidos: int
+    total_vendido: float
+    promedio_pedido: float
+    detalle_ventas: List[SaleSummary]
 
 class Token(BaseModel):
     access_token: str
     token_type: str
 
+# Respuesta de /token/refresh
+class TokenResponse(Token):
+    role: str
+    username: str
+
+# Respuesta de /token: incluye el refresh token
+class LoginResponse(TokenResponse):
+    refresh_token: str
+
+# Cuerpo de /token/refresh
+class TokenRefresh(BaseModel):
+    refresh_token: str
+
 class TokenData(BaseModel):
     username: Optional[str] = None
     role: Optional[str] = None
@@ -189,3 +242,15 @@ class UserResponse(BaseModel):
     
     model_config = ConfigDict(from_attributes=True)
 
+class UserRegistered(BaseModel):
+    id: int
+    username: str
+    role: str
+    message: str
+
+# Listado de usuarios para el panel de administración
+class UserOut(BaseModel):
+    id: int
+    username: str
+    role: str
+    is_active: bool
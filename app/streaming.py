@@ -0,0 +1,41 @@
+from typing import Iterator
+
+from fastapi.responses import StreamingResponse
+from pydantic import TypeAdapter
+
+# Listados sin limit: en lugar de cargar todo con .all(), las filas se leen por
+# lotes con yield_per y se envían como un arreglo JSON en streaming. El cliente
+# recibe el mismo arreglo completo, pero la memoria del servidor queda acotada a
+# un lote. El endpoint debe pedir la sesión con el scope por defecto de get_db,
+# porque la consulta sigue abierta mientras se envía la respuesta.
+STREAM_BATCH_SIZE = 500
+
+
+def por_lotes(query, size: int = STREAM_BATCH_SIZE) -> Iterator[list]:
+    """Itera una consulta en listas de hasta size filas"""
+    lote = []
+    for fila in query.yield_per(size):
+        lote.append(fila)
+        if len(lote) >= size:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def stream_json(query, adapter: TypeAdapter) -> StreamingResponse:
+    """Envía el resultado de la consulta como arreglo JSON, serializado por lotes.
+
+    adapter es un TypeAdapter de List[...]: cada lote se valida y se serializa en
+    una sola llamada al núcleo de pydantic.
+    """
+    def contenido():
+        yield b"["
+        separador = b""
+        for lote in por_lotes(query):
+            # Se quitan los corchetes del lote para unirlo al arreglo
+            yield separador + adapter.dump_json(adapter.validate_python(lote, from_attributes=True))[1:-1]
+            separador = b","
+        yield b"]"
+
+    return StreamingResponse(contenido(), media_type="application/json")
@@ -0,0 +1,16 @@
+#!/usr/bin/env python3
+"""Script para crear los índices faltantes en una base de datos existente.
+
+Los índices se definen en las migraciones de Alembic (0002); este script solo
+aplica las migraciones pendientes, igual que "alembic upgrade head".
+"""
+
+from app.database import aplicar_migraciones
+
+def create_indexes():
+    print("📇 Creando índices faltantes...")
+    aplicar_migraciones()
+    print("✅ Índices creados exitosamente")
+
+if __name__ == "__main__":
+    create_indexes()
@@ -3,8 +3,9 @@ Script para crear las tablas nuevas de presentaciones y medidas.
 Ejecutar antes de correr la app.
 """
 
-from app.database import engine, Base
-from app.models import UnitMeasure, Presentation
+from app.database import engine, aplicar_migraciones
+from app.models import UnitMeasure
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 
 
@@ -13,7 +14,7 @@ def crear_tablas():
     print("📊 Creando tablas de presentaciones y medidas...")
     
     try:
-        Base.metadata.create_all(bind=engine)
+        aplicar_migraciones()
         print("✅ Tablas creadas exitosamente")
     except Exception as e:
         print(f"❌ Error creando tablas: {e}")
@@ -39,16 +40,15 @@ def insertar_medidas_comunes():
     
     print("📏 Insertando medidas comunes...")
     
+    # Un solo INSERT ... ON CONFLICT DO NOTHING sin columnas de conflicto: se omite
+    # cualquier medida que choque con una restricción única (name o abbreviation)
+    dialecto = postgresql if engine.dialect.name == "postgresql" else sqlite
+    stmt = dialecto.insert(UnitMeasure).values(medidas).on_conflict_do_nothing()
+
     try:
-        for medida in medidas:
-            # Verificar si ya existe
-            existing = db.query(UnitMeasure).filter(UnitMeasure.name == medida["name"]).first()
-            if not existing:
-                new_measure = UnitMeasure(**medida)
-                db.add(new_measure)
-                print(f"  ✅ Medida '{medida['name']}' agregada")
-        
+        resultado = db.execute(stmt)
         db.commit()
+        print(f"  ✅ {resultado.rowcount} medidas agregadas")
         print("✅ Medidas insertadas exitosamente")
     except Exception as e:
         db.rollback()
@@ -1,12 +1,12 @@
 #!/usr/bin/env python3
 """Script para crear las tablas en la base de datos"""
 
-from app.database import engine
-from app.models import Base
+from app.database import aplicar_migraciones
 
 def create_tables():
     print("📊 Creando tablas en la base de datos...")
-    Base.metadata.create_all(bind=engine)
+    # Las tablas se crean con las migraciones de Alembic, no con create_all
+    aplicar_migraciones()
     print("✅ Tablas creadas exitosamente")
 
 if __name__ == "__main__":
@@ -1,24 +1,25 @@
 """Script para crear registros de stock faltantes para productos existentes"""
-from app.database import Base, engine, SessionLocal
+from sqlalchemy import insert, literal, select
+
+from app.database import SessionLocal, aplicar_migraciones
 from app.models import Product, Stock
 
-# Crear tablas
-Base.metadata.create_all(engine)
+# Aplicar las migraciones pendientes
+aplicar_migraciones()
 
 # Obtener sesión
 db = SessionLocal()
 
-# Obtener todos los productos
-productos = db.query(Product).all()
-
-# Para cada producto, verificar si tiene stock
-for producto in productos:
-    stock_existente = db.query(Stock).filter(Stock.product_id == producto.id).first()
-    if not stock_existente:
-        print(f"Creando stock para producto: {producto.name}")
-        nuevo_stock = Stock(product_id=producto.id, current_quantity=0)
-        db.add(nuevo_stock)
+# Un solo INSERT ... SELECT crea el stock de los productos que no lo tienen
+faltantes = (
+    select(Product.id, literal(0.0))
+    .outerjoin(Stock, Stock.product_id == Product.id)
+    .where(Stock.product_id.is_(None))
+)
+resultado = db.execute(
+    insert(Stock).from_select(["product_id", "current_quantity"], faltantes)
+)
 
 db.commit()
-print(f"✅ Stock actualizado para {len(productos)} productos")
+print(f"✅ Stock creado para {resultado.rowcount} productos")
 db.close()
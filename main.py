@@ -1,61 +1,136 @@
 import logging
 import os
+import threading
+import time
+from contextlib import asynccontextmanager
+
+from anyio import to_thread
+from cachetools import TTLCache
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 from fastapi.middleware.cors import CORSMiddleware
 
-from app import auth, models, database
+from app import auth, models, database, schemas
 from app.database import engine, Base
 from app.routes import productos, inventario, ventas, presentaciones, auth_users
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging (LOG_LEVEL=WARNING en producción omite los INFO por petición)
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
 logger = logging.getLogger(__name__)
-cors_origins_str = os.getenv("CORS_ORIGINS", "")
+
+# Orígenes permitidos por CORS, calculados una sola vez al importar. CORS_ORIGINS
+# es una lista separada por comas; sin la variable se permite solo el frontend
+# de producción.
+ORIGINS = tuple(
+    o.strip() for o in os.getenv("CORS_ORIGINS", "").split(",") if o.strip()
+) or ("https://tiendasinu-front-production.up.railway.app",)
+
+# Los endpoints síncronos corren en el threadpool de anyio (40 hilos por
+# defecto). THREADPOOL_SIZE solo lo cambia si se define. Cada hilo ocupado puede
+# retener una conexión, y los listados en streaming retienen la suya hasta
+# terminar de enviarse aunque no ocupen un hilo mientras esperan al cliente, así
+# que el pool de conexiones debe cubrir los hilos más los streams simultáneos.
+THREADPOOL_SIZE = os.getenv("THREADPOOL_SIZE")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if THREADPOOL_SIZE:
+        hilos = int(THREADPOOL_SIZE)
+        to_thread.current_default_thread_limiter().total_tokens = hilos
+        logger.info("✅ Threadpool configurado con %s hilos", hilos)
+        capacidad = database.DB_POOL_SIZE + database.DB_MAX_OVERFLOW
+        if hilos >= capacidad:
+            logger.warning(
+                "⚠️ THREADPOOL_SIZE (%s) no deja conexiones libres para los streams "
+                "(pool de %s conexiones)", hilos, capacidad
+            )
+    yield
+
 app = FastAPI(
     title="SinuTienda API",
     description="API para gestión de tienda con inventario y ventas",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
-# Si la variable existe, la dividimos; si no, permitimos "*" (o un valor por defecto)
-if cors_origins_str:
-    origins = [origin.strip() for origin in cors_origins_str.split(",")]
-else:
-    # Durante desarrollo o si olvidas la variable, esto evitará que se bloquee
-    origins = ["*"]
-
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["https://tiendasinu-front-production.up.railway.app"],
+    allow_origins=ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-models.Base.metadata.create_all(bind=engine)
-logger.info("✅ Base de datos inicializada")
+# El esquema se crea con migraciones de Alembic (alembic upgrade head) antes de
+# arrancar la app. En desarrollo, AUTO_CREATE_TABLES=1 crea las tablas al iniciar.
+if os.getenv("AUTO_CREATE_TABLES"):
+    models.Base.metadata.create_all(bind=engine)
+    logger.info("✅ Base de datos inicializada")
 
-@app.get("/health", tags=["Sistema"])
+@app.get("/health", response_model=schemas.HealthResponse, tags=["Sistema"])
 async def health_check():
     """Verificar estado de la API"""
     return {"status": "ok", "message": "API funcionando correctamente"}
 
-@app.get("/", tags=["Sistema"])
+@app.get("/", response_model=schemas.ApiInfo, tags=["Sistema"])
 async def root():
     """Información de la API"""
     return {"nombre": "SinuTienda API", "version": "1.0.0", "docs": "/docs"}
 
-@app.post("/token", tags=["Autenticación"])
-async def login_for_access_token(
+# Hash de referencia para usuarios inexistentes, calculado una sola vez
+_DUMMY_HASH = auth.get_password_hash("x" * 16)
+
+def _obtener_usuario_login(db: Session, username: str):
+    """Datos de login del usuario (id, username, password_hash, role, status)"""
+    # Sin caché: un usuario desactivado o con contraseña nueva se rechaza desde el
+    # primer intento. Solo se leen las columnas que usa el login, por el índice
+    # único de username.
+    return db.execute(
+        select(
+            models.User.id,
+            models.User.username,
+            models.User.password_hash,
+            models.User.role,
+            models.User.status,
+        ).where(models.User.username == username)
+    ).first()
+
+# Access tokens recién firmados, por usuario y ventana de 5 s: las ráfagas de
+# logins o renovaciones repetidas reciben el mismo token sin volver a firmarlo.
+# Un token cacheado tiene como mucho 5 s menos de vigencia que uno nuevo.
+_TOKEN_CACHE_SECONDS = 5
+_token_cache = TTLCache(maxsize=4096, ttl=_TOKEN_CACHE_SECONDS)
+_token_cache_lock = threading.Lock()
+
+def _emitir_access_token(claims: dict) -> str:
+    """Firma un access token o reutiliza el emitido en la misma ventana"""
+    clave = (claims["sub"], claims["role"], claims["uid"], int(time.time()) // _TOKEN_CACHE_SECONDS)
+    with _token_cache_lock:
+        token = _token_cache.get(clave)
+    if token is None:
+        token = auth.create_access_token(data=claims)
+        with _token_cache_lock:
+            _token_cache[clave] = token
+    return token
+
+# Función síncrona: FastAPI la ejecuta en el threadpool, así la consulta a la
+# base de datos y bcrypt no bloquean el event loop
+@app.post("/token", response_model=schemas.LoginResponse, tags=["Autenticación"])
+def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends(), 
-    db: Session = Depends(database.get_db)
+    db: Session = Depends(database.get_db, scope="function")
 ):
     """Endpoint para autenticar usuario y obtener token JWT"""
-    user = db.query(models.User).filter(models.User.username == form_data.username).first()
+    user = _obtener_usuario_login(db, form_data.username)
     
-    if not user or not auth.verify_password(form_data.password, user.password_hash):
-        logger.warning(f"❌ Intento de login fallido para usuario: {form_data.username}")
+    # Siempre se verifica un hash, aunque el usuario no exista: el tiempo de
+    # respuesta no revela qué usuarios están registrados
+    password_ok = auth.verify_password(
+        form_data.password, user.password_hash if user else _DUMMY_HASH
+    )
+    if not user or not password_ok:
+        logger.warning("❌ Intento de login fallido para usuario: %s", form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Usuario o contraseña incorrectos",
@@ -63,18 +138,64 @@ async def login_for_access_token(
         )
     
     if not user.status:
-        logger.warning(f"❌ Intento de login con usuario inactivo: {form_data.username}")
+        logger.warning("❌ Intento de login con usuario inactivo: %s", form_data.username)
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Usuario inactivo"
         )
     
-    access_token = auth.create_access_token(
-        data={"sub": user.username, "role": user.role.value}
-    )
-    logger.info(f"✅ Login exitoso para usuario: {form_data.username}")
+    # Actualizar hashes generados con un costo de bcrypt distinto al configurado
+    if auth.password_needs_rehash(user.password_hash):
+        nuevo_hash = auth.get_password_hash(form_data.password)
+        db.execute(
+            update(models.User).where(models.User.id == user.id).values(password_hash=nuevo_hash)
+        )
+        db.commit()
+        logger.info("🔄 Hash de contraseña actualizado para usuario: %s", form_data.username)
+    
+    claims = {"sub": user.username, "role": user.role.value, "uid": user.id}
+    access_token = _emitir_access_token(claims)
+    logger.info("✅ Login exitoso para usuario: %s", form_data.username)
     return {
         "access_token": access_token,
+        "refresh_token": auth.create_refresh_token(claims),
+        "token_type": "bearer",
+        "role": user.role.value,
+        "username": user.username
+    }
+
+# Renovar el access token sin bcrypt: se valida la firma del refresh token y se
+# consulta el usuario por su id, así desactivarlo corta también las renovaciones
+@app.post("/token/refresh", response_model=schemas.TokenResponse, tags=["Autenticación"])
+def refresh_access_token(
+    datos: schemas.TokenRefresh,
+    db: Session = Depends(database.get_db, scope="function")
+):
+    """Obtiene un nuevo token JWT a partir de un refresh token"""
+    payload = auth.decode_refresh_token(datos.refresh_token)
+    user = db.execute(
+        select(models.User.id, models.User.username, models.User.role, models.User.status)
+        .where(models.User.id == payload.get("uid"))
+    ).first()
+
+    if not user or user.username != payload["sub"]:
+        logger.warning("❌ Refresh token de usuario inexistente: %s", payload["sub"])
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="No se pudo validar las credenciales",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not user.status:
+        logger.warning("❌ Refresh token de usuario inactivo: %s", user.username)
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Usuario inactivo"
+        )
+
+    # El rol se toma de la base de datos: un cambio de rol aplica al renovar
+    claims = {"sub": user.username, "role": user.role.value, "uid": user.id}
+    return {
+        "access_token": _emitir_access_token(claims),
         "token_type": "bearer",
         "role": user.role.value,
         "username": user.username
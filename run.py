@@ -3,7 +3,11 @@
 
 import uvicorn
 
+from app.database import aplicar_migraciones
+
 if __name__ == "__main__":
+    # Aplicar las migraciones pendientes antes de iniciar el servidor
+    aplicar_migraciones()
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
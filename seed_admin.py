@@ -1,12 +1,14 @@
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
-from app.database import SessionLocal, engine, Base
+from app.database import SessionLocal, engine, aplicar_migraciones
 from app.models import User, UserRole
 from app.auth import get_password_hash
 import sys
 
 def create_first_admin():
-    # Crear todas las tablas primero
-    Base.metadata.create_all(bind=engine)
+    # Aplicar las migraciones primero
+    aplicar_migraciones()
     
     db: Session = SessionLocal()
     
@@ -14,23 +16,33 @@ def create_first_admin():
     username = "admin"
     password = "admin123" # ¡Cámbiala después!
 
-    # Verificar si ya existe
-    existing_user = db.query(User).filter(User.username == username).first()
+    # Verificar si ya existe (antes de calcular el hash con bcrypt)
+    existing_user = db.execute(select(User.id).where(User.username == username)).first()
     if existing_user:
         print(f"Error: El usuario '{username}' ya existe.")
         db.close()
         return
 
-    try:
-        new_admin = User(
+    # INSERT ... ON CONFLICT DO NOTHING: si otro proceso lo creó entretanto no falla
+    dialecto = postgresql if engine.dialect.name == "postgresql" else sqlite
+    stmt = (
+        dialecto.insert(User)
+        .values(
             username=username,
             password_hash=get_password_hash(password),
             role=UserRole.admin,
             status=True
         )
-        
-        db.add(new_admin)
+        .on_conflict_do_nothing(index_elements=["username"])
+        .returning(User.id)
+    )
+
+    try:
+        new_admin_id = db.execute(stmt).scalar()
         db.commit()
+        if new_admin_id is None:
+            print(f"Error: El usuario '{username}' ya existe.")
+            return
         print("------------------------------------------")
         print("✅ Administrador creado con éxito")
         print(f"👤 Usuario: {username}")